@@ -1,4 +1,5 @@
 """Кастомные исключения для homework_bot."""
+from http import HTTPStatus
 
 
 class MissingTokenException(ValueError):
@@ -10,8 +11,24 @@ class MissingTokenException(ValueError):
 class EndpointRequestFailure(Exception):
     """Исключение непредвиденного сбоя при запросе к API ЯП."""
 
-    def __init__(self, status_code):
-        """Создает сообщение ошибки."""
+    def __init__(self, reason, retry_after=None):
+        """
+        Создает сообщение ошибки.
+
+        reason - код ответа API или название исключения запроса.
+        """
+        super().__init__(
+            f"Запрос к эндпоинту API ЯП выдал ошибку: {reason}"
+        )
+        self.retry_after = retry_after
+
+
+class EndpointRateLimited(EndpointRequestFailure):
+    """Исключение превышения лимита запросов к API ЯП (код 429)."""
+
+    def __init__(self, retry_after):
+        """Создает сообщение ошибки с паузой из Retry-After."""
         super().__init__(
-            f"Запрос к эндпоинту API ЯП выдал ошибку: {status_code}"
+            HTTPStatus.TOO_MANY_REQUESTS.value,
+            retry_after=retry_after
         )
@@ -1,16 +1,27 @@
 """Телеграм бот, отправляющий обновления статусов ДЗ для Яндекс Практикума."""
+import hmac
+import json
 import logging
 import os
+import random
+import socket
 import sys
+import threading
 import time
+from collections import deque
+from functools import singledispatch
 from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from telebot import TeleBot
 from telebot.apihelper import ApiException
 
-from exceptions import EndpointRequestFailure, MissingTokenException
+from exceptions import (
+    EndpointRateLimited, EndpointRequestFailure, MissingTokenException
+)
 
 load_dotenv()
 
@@ -18,9 +29,47 @@ PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
+# polling - опрос API по таймеру, webhook - прием обновлений по HTTP.
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = '/webhook/practicum'
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_SECRET_HEADER = 'X-Webhook-Secret'
+# Наибольший размер тела обновления в байтах и время ожидания клиента.
+WEBHOOK_MAX_BODY_SIZE = 64 * 1024
+WEBHOOK_TIMEOUT = 10
+
 RETRY_PERIOD = 600
+RETRY_PERIOD_MIN = 1
+# Пауза после ответа 429 без корректного заголовка Retry-After.
+RETRY_AFTER_DEFAULT = 60
+# Одна и та же ошибка отправляется в telegram не чаще раза в ERROR_WINDOW
+# секунд; помним не больше ERROR_WINDOW_SIZE последних ошибок.
+ERROR_WINDOW = 3600
+ERROR_WINDOW_SIZE = 16
+# Ограничение Telegram на длину одного сообщения.
+MESSAGE_MAX_LENGTH = 4096
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+REQUEST_TIMEOUT = (5, 30)
+# Коды ответа API как обычные int: сравниваются при каждом опросе.
+STATUS_OK = HTTPStatus.OK.value
+STATUS_NOT_MODIFIED = HTTPStatus.NOT_MODIFIED.value
+STATUS_TOO_MANY_REQUESTS = HTTPStatus.TOO_MANY_REQUESTS.value
+
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount(
+    'https://',
+    HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+)
+# Последний ответ API и его ETag: повторный запрос с тем же from_date
+# отправляется с If-None-Match, а на 304 возвращается сохраненный ответ.
+response_cache = {'from_date': None, 'etag': None, 'response': None}
+# id ДЗ и последний отправленный в telegram статус: повторно полученный
+# тот же статус (например, без сдвига from_date) не отправляется.
+sent_statuses = {}
 
 
 HOMEWORK_VERDICTS = {
@@ -28,48 +77,25 @@ HOMEWORK_VERDICTS = {
     'reviewing': 'Работа взята на проверку ревьюером.',
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
-ERROR_HANDLERS = {
-    requests.exceptions.HTTPError: (
-        lambda e: f'Эндпоинт Яндекс Практикума не отвечает: {e}'),
-    EndpointRequestFailure: (
-        lambda e: f'Эндпоинт Яндекс Практикума недоступен: {e}'),
-    TypeError: lambda e: f'Ответ содержит неожиданный тип данных: {e}',
-    ValueError: lambda e: f'Ответ содержит неожиданные значения: {e}',
-    KeyError: lambda e: f'Ответ не содержит ключи: {e}',
-}
+STATUS_MESSAGE = 'Изменился статус проверки работы "{}". {}'
 
 FORMAT_STRING = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter(FORMAT_STRING)
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
-
-
-def prepare_request_params(payload: dict[str, int]):
-    """Подготваливает словарь с параметрами запроса."""
-    request_info = {
-        'url': ENDPOINT,
-        'headers': HEADERS,
-        'params': payload
-    }
-    return request_info
 
 
 def check_tokens() -> None:
     """Проверяет наличие и корректность токенов эндпоинта, телеграма."""
-    missing_env_vars = []
-    ENVIRONMENT_VARS = {
+    environment_vars = {
         'PRACTICUM_TOKEN': PRACTICUM_TOKEN,
         'TELEGRAM_TOKEN': TELEGRAM_TOKEN,
         'TELEGRAM_CHAT_ID': TELEGRAM_CHAT_ID,
     }
-    for env_name, env_val in ENVIRONMENT_VARS.items():
-        if not env_val:
-            missing_env_vars.append(env_name)
+    missing_env_vars = [
+        env_name for env_name, env_val in environment_vars.items()
+        if not env_val
+    ]
     if missing_env_vars:
         error_message = (
             f'Отсутсвуют токены: {missing_env_vars}\n'
@@ -91,12 +117,13 @@ def send_message(bot: TeleBot, message: str) -> bool:
         bot.send_message(
             chat_id=TELEGRAM_CHAT_ID,
             text=message,
+            disable_web_page_preview=True,
         )
     except (
         requests.exceptions.RequestException,
         ApiException
     ) as e:
-        logger.error(f'Сбой в отправке сообщения через telegram: {e}')
+        logger.error('Сбой в отправке сообщения через telegram: %s', e)
         return False
     else:
         logger.debug('Успешная отправка сообщения через telegram')
@@ -110,16 +137,41 @@ def get_api_answer(timestamp: int) -> dict:
     timestamp - момент времени формата UNIX epoche, с которого нужно проверить.
     """
     payload = {'from_date': timestamp}
-    parameters = prepare_request_params(payload)
+    headers = {}
+    if response_cache['from_date'] == timestamp and response_cache['etag']:
+        headers['If-None-Match'] = response_cache['etag']
     try:
-        logging.debug('Отправка запроса на {url}, заголовки: {headers},'
-                      ' параметры запроса: {params}'.format(**parameters))
-        homework_response = requests.get(**parameters)
+        logger.debug(
+            'Отправка запроса на %s, параметры запроса: %s',
+            ENDPOINT, payload
+        )
+        homework_response = SESSION.get(
+            ENDPOINT,
+            params=payload,
+            headers=headers,
+            timeout=REQUEST_TIMEOUT
+        )
     except requests.RequestException as e:
-        raise EndpointRequestFailure(e.response.status_code) from e
-    if homework_response.status_code != HTTPStatus.OK:
-        raise EndpointRequestFailure(homework_response.status_code)
-    return homework_response.json()
+        logger.debug('Сбой запроса к эндпоинту: %s', e)
+        raise EndpointRequestFailure(type(e).__name__) from e
+    status_code = homework_response.status_code
+    if status_code == STATUS_NOT_MODIFIED and headers:
+        logger.debug('Ответ API не изменился с прошлого запроса')
+        return response_cache['response']
+    if status_code == STATUS_TOO_MANY_REQUESTS:
+        retry_after = homework_response.headers.get('Retry-After', '')
+        raise EndpointRateLimited(
+            int(retry_after) if retry_after.isdigit() else RETRY_AFTER_DEFAULT
+        )
+    if status_code != STATUS_OK:
+        raise EndpointRequestFailure(status_code)
+    response = homework_response.json()
+    response_cache.update(
+        from_date=timestamp,
+        etag=homework_response.headers.get('ETag'),
+        response=response
+    )
+    return response
 
 
 def check_response(response: dict) -> list:
@@ -129,9 +181,9 @@ def check_response(response: dict) -> list:
             f'Ответ не приведен в формат json. Тип ответа - {type(response)}'
         )
 
-    if 'homeworks' not in response:
+    homeworks = response.get('homeworks')
+    if homeworks is None:
         raise KeyError('В ответе отсутствует ключ homeworks')
-    homeworks = response['homeworks']
 
     if not isinstance(homeworks, list):
         raise TypeError(
@@ -148,65 +200,259 @@ def parse_status(homework: dict) -> str:
 
     homework - словарь из ответа API, соответсвующий одному ДЗ.
     """
-    if 'status' not in homework.keys():
-        raise KeyError('status')
-    if 'homework_name' not in homework.keys():
-        raise KeyError('Ключ homework_name отсутсвует')
-    if (
-        not isinstance(homework['status'], str)
-    ) or (
-        not isinstance(homework['homework_name'], str)
+    try:
+        homework_name = homework['homework_name']
+    except KeyError:
+        raise KeyError('Ключ homework_name отсутсвует') from None
+    if not isinstance(homework_name, str):
+        raise TypeError('Имя ДЗ не строка')
+    try:
+        verdict = HOMEWORK_VERDICTS[homework['status']]
+    except KeyError as e:
+        raise KeyError(f'Статус ДЗ отсутствует или неизвестен: {e}') from None
+    return STATUS_MESSAGE.format(homework_name, verdict)
+
+
+def build_messages(homeworks: list) -> list:
+    """
+    Функция собирает статусы всех ДЗ из ответа в сообщения для telegram.
+
+    Статусы объединяются в одно сообщение, пока оно укладывается
+    в MESSAGE_MAX_LENGTH символов, иначе начинается следующее; слишком
+    длинный статус обрезается. ДЗ с некорректным статусом пишется в log
+    и пропускается, не мешая остальным. Возвращает пары (сообщение, его ДЗ).
+    """
+    messages = []
+    for homework in homeworks:
+        try:
+            status = parse_status(homework)
+        except (KeyError, TypeError) as error:
+            logger.error(format_error(error))
+            continue
+        if len(status) > MESSAGE_MAX_LENGTH:
+            status = status[:MESSAGE_MAX_LENGTH - 1] + '…'
+        if messages and (
+            len(messages[-1][0]) + len(status) + 2 <= MESSAGE_MAX_LENGTH
+        ):
+            message, message_homeworks = messages[-1]
+            messages[-1] = (
+                f'{message}\n\n{status}', message_homeworks + [homework]
+            )
+        else:
+            messages.append((status, [homework]))
+    return messages
+
+
+def select_unsent(homeworks: list) -> list:
+    """
+    Функция отбирает ДЗ, статус которых еще не отправлялся в telegram.
+
+    ДЗ без id не с чем сопоставить, они отправляются всегда.
+    """
+    return [
+        homework for homework in homeworks
+        if not isinstance(homework, dict) or homework.get('id') is None
+        or sent_statuses.get(homework['id']) != homework.get('status')
+    ]
+
+
+def send_statuses(bot: TeleBot, homeworks: list) -> bool:
+    """
+    Функция отправляет в telegram статусы ДЗ, которые еще не отправлялись.
+
+    ДЗ запоминаются после отправки каждого сообщения, поэтому при сбое
+    уже отправленная часть не повторяется. Возвращает True, если все
+    сообщения отправлены (или отправлять нечего).
+    """
+    for message, message_homeworks in build_messages(
+        select_unsent(homeworks)
     ):
-        raise TypeError('Статус или имя ДЗ не строки')
-    if homework['status'] not in HOMEWORK_VERDICTS.keys():
-        raise KeyError('status')
-    homework_name = homework['homework_name']
-    verdict = HOMEWORK_VERDICTS.get(homework['status'])
-    return f'Изменился статус проверки работы "{homework_name}". {verdict}'
+        if not send_message(bot=bot, message=message):
+            return False
+        sent_statuses.update(
+            (homework['id'], homework['status'])
+            for homework in message_homeworks
+            if homework.get('id') is not None
+        )
+    return True
+
+
+@singledispatch
+def format_error(error: Exception) -> str:
+    """
+    Функция формирует сообщение об ошибке для log и telegram.
+
+    Формирователь выбирается по типу ошибки с учетом родительских классов,
+    результат выбора кэшируется для каждого типа.
+    """
+    return f'Сбой в работе программы: {error}'
+
+
+@format_error.register(requests.exceptions.RequestException)
+def _(error):
+    return f'Эндпоинт Яндекс Практикума не отвечает: {error}'
+
+
+@format_error.register(EndpointRequestFailure)
+def _(error):
+    return f'Эндпоинт Яндекс Практикума недоступен: {error}'
+
 
+@format_error.register(EndpointRateLimited)
+def _(error):
+    return f'Превышен лимит запросов к API Яндекс Практикума: {error}'
 
-def handle_error(bot, error_message, last_error_message):
-    """Функция отправляет сообщение об ошибке в log и telegram."""
+
+@format_error.register(TypeError)
+def _(error):
+    return f'Ответ содержит неожиданный тип данных: {error}'
+
+
+@format_error.register(ValueError)
+def _(error):
+    return f'Ответ содержит неожиданные значения: {error}'
+
+
+@format_error.register(KeyError)
+def _(error):
+    return f'Ответ не содержит ключи: {error}'
+
+
+def handle_error(bot, error_message, recent_errors):
+    """
+    Функция отправляет сообщение об ошибке в log и telegram.
+
+    recent_errors - очередь (время, хэш сообщения) недавно отправленных
+    ошибок: ошибка, уже отправленная за последние ERROR_WINDOW секунд,
+    пишется только в log.
+    """
     logger.error(error_message)
-    if error_message != last_error_message:
-        send_message(bot, error_message)
-    return error_message
+    now = time.time()
+    while recent_errors and recent_errors[0][0] < now - ERROR_WINDOW:
+        recent_errors.popleft()
+    message_hash = hash(error_message)
+    if any(sent_hash == message_hash for _, sent_hash in recent_errors):
+        return
+    recent_errors.append((now, message_hash))
+    send_message(bot, error_message)
+
+
+class PracticumWebhookHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик вебхука с обновлениями статусов ДЗ.
+
+    Тело запроса - JSON того же формата, что и ответ API домашки.
+    Бот для отправки сообщений берется из атрибута сервера bot.
+    Запросы обрабатываются в отдельных потоках, отправка статусов
+    выполняется под общей блокировкой.
+    """
+
+    timeout = WEBHOOK_TIMEOUT
+    send_lock = threading.Lock()
+
+    def do_POST(self):
+        """Проверяет обновление и отправляет статус ДЗ в telegram."""
+        if self.path != WEBHOOK_PATH:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        # http.server декодирует заголовки как latin-1, поэтому обратное
+        # кодирование возвращает исходные байты.
+        secret = self.headers.get(WEBHOOK_SECRET_HEADER, '').encode('latin-1')
+        if not hmac.compare_digest(secret, (WEBHOOK_SECRET or '').encode()):
+            self.send_error(HTTPStatus.FORBIDDEN)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if not 0 <= length <= WEBHOOK_MAX_BODY_SIZE:
+                raise ValueError(f'недопустимый Content-Length: {length}')
+            homeworks = check_response(json.loads(self.rfile.read(length)))
+            if not homeworks:
+                logger.debug('Статус домашнего задания не обновлялся')
+            with self.send_lock:
+                sent = send_statuses(self.server.bot, homeworks)
+        except socket.timeout:
+            logger.error('Вебхук не дождался тела обновления')
+            self.send_error(HTTPStatus.REQUEST_TIMEOUT)
+            return
+        except (TypeError, ValueError, KeyError) as error:
+            logger.error('Некорректное обновление от вебхука: %s', error)
+            self.send_error(HTTPStatus.BAD_REQUEST)
+            return
+        if not sent:
+            self.send_error(HTTPStatus.BAD_GATEWAY)
+            return
+        self.send_response(HTTPStatus.OK)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        """Пишет журнал запросов сервера в логгер бота."""
+        logger.debug(format, *args)
+
+
+def run_webhook(bot):
+    """Функция запускает HTTP-сервер для приема обновлений по вебхуку."""
+    if not WEBHOOK_SECRET:
+        error_message = (
+            'Отсутсвует токен WEBHOOK_SECRET для режима webhook.\n'
+            'Принудительная останвока программы.'
+        )
+        logger.critical(error_message)
+        raise MissingTokenException(error_message)
+    server = ThreadingHTTPServer(
+        (WEBHOOK_LISTEN, WEBHOOK_PORT),
+        PracticumWebhookHandler
+    )
+    server.bot = bot
+    logger.debug(
+        'Ожидание обновлений на %s:%s%s',
+        WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH
+    )
+    with server:
+        server.serve_forever()
+
+
+def get_retry_delay(error, backoff):
+    """
+    Функция вычисляет паузу перед повторным запросом после ошибки.
+
+    Если API прислал Retry-After, используется он, иначе - текущая
+    экспоненциальная задержка со случайным разбросом до 50%.
+    """
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        return retry_after
+    return backoff * random.uniform(1, 1.5)
 
 
 def main():
     """Основная логика работы бота."""
+    check_tokens()
+
     bot = TeleBot(token=TELEGRAM_TOKEN)
     timestamp = int(time.time())
-    last_error_message = ''
+    recent_errors = deque(maxlen=ERROR_WINDOW_SIZE)
+    backoff = RETRY_PERIOD_MIN
 
-    check_tokens()
+    if RUN_MODE == 'webhook':
+        run_webhook(bot)
+        return
 
     while True:
         try:
             homework_response = get_api_answer(
                 timestamp=timestamp)
             homeworks = check_response(homework_response)
-            if homeworks:
-                message = parse_status(homeworks[0])
-                if send_message(bot=bot, message=message):
-                    timestamp = homework_response.get(
-                        'current_date',
-                        timestamp
-                    )
-                    last_error_message = ''
-            else:
+            if not homeworks:
                 logger.debug('Статус домашнего задания не обновлялся')
+            elif send_statuses(bot, homeworks):
+                timestamp = homework_response.get('current_date', timestamp)
+            delay = RETRY_PERIOD
+            backoff = RETRY_PERIOD_MIN
         except Exception as error:
-            for exc_type, message_func in ERROR_HANDLERS.items():
-                if isinstance(error, exc_type):
-                    error_message = message_func(error)
-                    last_error_message = handle_error(
-                        bot,
-                        error_message,
-                        last_error_message)
-                    break
-        finally:
-            time.sleep(RETRY_PERIOD)
+            handle_error(bot, format_error(error), recent_errors)
+            delay = get_retry_delay(error, backoff)
+            backoff = min(backoff * 2, RETRY_PERIOD)
+        time.sleep(delay)
 
 
 if __name__ == '__main__':
@@ -85,10 +85,11 @@ class MockResponseGET:
 
     def __init__(
             self, *args, random_timestamp=None, http_status=HTTPStatus.OK,
-            data=None, **kwargs
+            data=None, response_headers=None, **kwargs
     ):
         self.random_timestamp = random_timestamp
         self.status_code = http_status
+        self.headers = response_headers or {}
         self.reason = ''
         self.text = ''
         default_data = {
@@ -1,7 +1,10 @@
+import http.client
 import inspect
+import json
 import logging
 import platform
 import re
+import threading
 import time
 from http import HTTPStatus
 
@@ -36,6 +39,45 @@ def get_mock_telegram_bot(monkeypatch, random_message):
     return telebot.TeleBot(token='')
 
 
+WEBHOOK_SECRET = 'webhook-secret'
+
+
+@pytest.fixture
+def webhook_server(
+        monkeypatch, random_message, homework_module, data_with_new_hw_status
+):
+    """
+    Start the webhook server on a free local port and yield it together
+    with a helper that posts the new status update with given headers.
+    """
+    monkeypatch.setattr(homework_module, 'WEBHOOK_SECRET', WEBHOOK_SECRET)
+    monkeypatch.setattr(homework_module, 'sent_statuses', {})
+    server = homework_module.ThreadingHTTPServer(
+        ('127.0.0.1', 0), homework_module.PracticumWebhookHandler
+    )
+    server.bot = get_mock_telegram_bot(monkeypatch, random_message)
+    threading.Thread(
+        target=server.serve_forever, kwargs={'poll_interval': 0.05},
+        daemon=True
+    ).start()
+
+    def post_update(headers):
+        connection = http.client.HTTPConnection(
+            *server.server_address, timeout=1
+        )
+        connection.request(
+            'POST', homework_module.WEBHOOK_PATH,
+            body=json.dumps(data_with_new_hw_status), headers=headers
+        )
+        return connection.getresponse().status
+
+    try:
+        yield server, post_update
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
 class TestHomework:
     HOMEWORK_VERDICTS = {
         'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
@@ -175,17 +217,21 @@ class TestHomework:
             assert url.startswith(expected_url), (
                 'Проверьте адрес, на который отправляются запросы.'
             )
-            assert 'headers' in kwargs, (
-                'Проверьте, что в запрос к API передан заголовок.'
-            )
-            assert 'Authorization' in kwargs['headers'], (
+            headers = {
+                **homework_module.SESSION.headers,
+                **kwargs.get('headers', {})
+            }
+            assert 'Authorization' in headers, (
                 'Проверьте, что в заголовках запроса передано поле '
                 '`Authorization`.'
             )
-            assert kwargs['headers']['Authorization'].startswith('OAuth '), (
+            assert headers['Authorization'].startswith('OAuth '), (
                 'Проверьте, что заголовок `Authorization` '
                 'начинается с `OAuth`.'
             )
+            assert kwargs.get('timeout'), (
+                'Проверьте, что в запросе к API задан таймаут `timeout`.'
+            )
             assert 'params' in kwargs, (
                 'Проверьте, что в запросе переданы параметры `params`.'
             )
@@ -203,7 +249,9 @@ class TestHomework:
                     'Проверьте, что в параметре `from_date` передано число.'
                 )
 
-        monkeypatch.setattr(requests, 'get', check_request_call)
+        monkeypatch.setattr(
+            homework_module.SESSION, 'get', check_request_call
+        )
         try:
             homework_module.get_api_answer(current_timestamp)
         except AssertionError:
@@ -228,7 +276,9 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr(
+            homework_module.SESSION, 'get', mock_response_get
+        )
 
         result = homework_module.get_api_answer(current_timestamp)
         assert isinstance(result, dict), (
@@ -246,7 +296,7 @@ class TestHomework:
             self.HOMEWORK_FUNC_WITH_PARAMS_QTY[func_name]
         )
 
-        monkeypatch.setattr(requests, 'get', response)
+        monkeypatch.setattr(homework_module.SESSION, 'get', response)
         try:
             homework_module.get_api_answer(current_timestamp)
         except Exception:
@@ -270,7 +320,9 @@ class TestHomework:
         def mock_request_get_with_exception(*args, **kwargs):
             raise requests.RequestException('Something wrong')
 
-        monkeypatch.setattr(requests, 'get', mock_request_get_with_exception)
+        monkeypatch.setattr(
+            homework_module.SESSION, 'get', mock_request_get_with_exception
+        )
         try:
             homework_module.get_api_answer(current_timestamp)
         except requests.RequestException as e:
@@ -282,6 +334,105 @@ class TestHomework:
         except Exception:
             pass
 
+    def test_get_api_answer_not_modified(
+            self, monkeypatch, random_timestamp, current_timestamp,
+            homework_module
+    ):
+        func_name = 'get_api_answer'
+        monkeypatch.setattr(homework_module, 'response_cache', {
+            'from_date': None, 'etag': None, 'response': None
+        })
+        etag = '"homeworks-etag"'
+        expected_data = {
+            'homeworks': [],
+            'current_date': random_timestamp
+        }
+
+        def mock_response_get_with_etag(*args, headers=None, **kwargs):
+            if (headers or {}).get('If-None-Match') == etag:
+                return check_utils.MockResponseGET(
+                    http_status=HTTPStatus.NOT_MODIFIED, data={}
+                )
+            return check_utils.MockResponseGET(
+                data=expected_data, response_headers={'ETag': etag}
+            )
+
+        monkeypatch.setattr(
+            homework_module.SESSION, 'get', mock_response_get_with_etag
+        )
+        homework_module.get_api_answer(current_timestamp)
+        result = homework_module.get_api_answer(current_timestamp)
+        assert result == expected_data, (
+            f'Проверьте, что функция `{func_name}` возвращает сохраненный '
+            'ответ, если API домашки ответил кодом 304.'
+        )
+
+    def test_get_api_answer_too_many_requests(
+            self, monkeypatch, current_timestamp, homework_module
+    ):
+        func_name = 'get_api_answer'
+        retry_after = 42
+
+        def mock_response_get_rate_limited(*args, **kwargs):
+            return check_utils.MockResponseGET(
+                http_status=HTTPStatus.TOO_MANY_REQUESTS, data={},
+                response_headers={'Retry-After': str(retry_after)}
+            )
+
+        monkeypatch.setattr(
+            homework_module.SESSION, 'get', mock_response_get_rate_limited
+        )
+        try:
+            homework_module.get_api_answer(current_timestamp)
+        except Exception as e:
+            assert getattr(e, 'retry_after', None) == retry_after, (
+                f'Убедитесь, что функция `{func_name}` передает значение '
+                'заголовка `Retry-After` при ответе API с кодом 429.'
+            )
+        else:
+            raise AssertionError(
+                f'Убедитесь, что в функции `{func_name}` обрабатывается '
+                'ситуация, когда API домашки возвращает код 429.'
+            )
+
+    def test_get_api_answer_too_many_requests_without_retry_after(
+            self, monkeypatch, current_timestamp, homework_module
+    ):
+        def mock_response_get_rate_limited(*args, **kwargs):
+            return check_utils.MockResponseGET(
+                http_status=HTTPStatus.TOO_MANY_REQUESTS, data={}
+            )
+
+        monkeypatch.setattr(
+            homework_module.SESSION, 'get', mock_response_get_rate_limited
+        )
+        try:
+            homework_module.get_api_answer(current_timestamp)
+        except homework_module.EndpointRateLimited as e:
+            assert e.retry_after == homework_module.RETRY_AFTER_DEFAULT, (
+                'Убедитесь, что при ответе 429 без заголовка `Retry-After` '
+                'используется пауза по умолчанию.'
+            )
+        else:
+            raise AssertionError(
+                'Убедитесь, что при ответе API с кодом 429 выбрасывается '
+                '`EndpointRateLimited`.'
+            )
+
+    def test_get_retry_delay(self, homework_module):
+        backoff = 8
+        for _ in range(10):
+            delay = homework_module.get_retry_delay(ValueError(), backoff)
+            assert backoff <= delay <= backoff * 1.5, (
+                'Убедитесь, что пауза после ошибки - это экспоненциальная '
+                'задержка со случайным разбросом.'
+            )
+        error = homework_module.EndpointRequestFailure(429, retry_after=30)
+        assert homework_module.get_retry_delay(error, backoff) == 30, (
+            'Убедитесь, что пауза после ответа 429 берется из заголовка '
+            '`Retry-After`.'
+        )
+
     def test_parse_status_with_expected_statuses(self, homework_module):
         func_name = 'parse_status'
         check_utils.check_function(
@@ -534,6 +685,7 @@ class TestHomework:
         monkeypatch.setattr(homework_module, 'PRACTICUM_TOKEN', 'sometoken')
         monkeypatch.setattr(homework_module, 'TELEGRAM_TOKEN', '1234:abcdefg')
         monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '12345')
+        monkeypatch.setattr(homework_module, 'sent_statuses', {})
 
         func_name = 'main'
         check_utils.check_function(
@@ -595,7 +747,7 @@ class TestHomework:
                 data=response_data
             ))
         monkeypatch.setattr(
-            requests,
+            homework_module.SESSION,
             'get',
             mock_response_get_with_new_status
         )
@@ -658,7 +810,7 @@ class TestHomework:
                     )
                 ]
                 assert log_record, (
-                    'Убедитесь, что бот использует функцию `requests.get()` '
+                    'Убедитесь, что бот использует метод `SESSION.get()` '
                     'для отправки запроса к API домашки.'
                 )
 
@@ -751,6 +903,41 @@ class TestHomework:
                     f'Вызов функции `main` завершился ошибкой: {e}'
                 ) from e
 
+    def test_main_does_not_resend_status(
+            self, monkeypatch, random_timestamp, current_timestamp,
+            random_message, homework_module, data_with_new_hw_status
+    ):
+        self.mock_main(
+            monkeypatch,
+            random_message,
+            random_timestamp,
+            current_timestamp,
+            homework_module,
+            response_data=data_with_new_hw_status
+        )
+        sent_messages = []
+        sleeps = []
+
+        def mock_send_message(bot, message=''):
+            sent_messages.append(message)
+            return True
+
+        def sleep_twice(secs):
+            sleeps.append(secs)
+            if len(sleeps) == 2:
+                raise check_utils.BreakInfiniteLoop('break')
+
+        monkeypatch.setattr(homework_module, 'send_message', mock_send_message)
+        monkeypatch.setattr(time, 'sleep', sleep_twice)
+        try:
+            homework_module.main()
+        except check_utils.BreakInfiniteLoop:
+            pass
+        assert len(sent_messages) == 1, (
+            'Убедитесь, что бот не отправляет в Telegram повторно статус '
+            'домашней работы, полученный в следующем ответе API.'
+        )
+
     def test_main_log_response_whithout_homeworks(
             self, monkeypatch, random_timestamp, current_timestamp,
             random_message, caplog, homework_module
@@ -822,6 +1009,240 @@ class TestHomework:
                     'возникновении ошибки отправки сообщения в Телеграм.'
                 ) from e
 
+    def test_build_messages(self, homework_module):
+        homeworks = [
+            {'homework_name': f'hw{i}', 'status': 'approved'}
+            for i in range(3)
+        ]
+        messages = homework_module.build_messages(homeworks)
+        assert messages == [('\n\n'.join(
+            homework_module.parse_status(homework) for homework in homeworks
+        ), homeworks)], (
+            'Убедитесь, что статусы всех домашних работ из ответа '
+            'отправляются одним сообщением.'
+        )
+
+        homeworks = [
+            {'homework_name': 'x' * 3000, 'status': 'approved'}
+            for _ in range(3)
+        ] + [{'homework_name': 'x' * 5000, 'status': 'approved'}]
+        messages = homework_module.build_messages(homeworks)
+        assert len(messages) == 4 and all(
+            len(message) <= homework_module.MESSAGE_MAX_LENGTH
+            for message, _ in messages
+        ), (
+            'Убедитесь, что слишком длинное сообщение разбивается на части '
+            'не длиннее ограничения Telegram.'
+        )
+
+    def test_send_statuses_skips_invalid_homeworks(
+            self, monkeypatch, homework_module
+    ):
+        sent_messages = []
+
+        def mock_send_message(bot, message=''):
+            sent_messages.append(message)
+            return True
+
+        monkeypatch.setattr(homework_module, 'send_message', mock_send_message)
+        monkeypatch.setattr(homework_module, 'sent_statuses', {})
+        valid = {'id': 1, 'homework_name': 'hw1', 'status': 'approved'}
+        homeworks = [
+            {'id': 2, 'homework_name': 'hw2', 'status': 'unknown'},
+            valid,
+            {'id': 3, 'homework_name': 'hw3'},
+            'not a homework',
+        ]
+        assert homework_module.send_statuses(None, homeworks), (
+            'Убедитесь, что некорректная домашняя работа в ответе '
+            'не мешает отправке остальных.'
+        )
+        assert sent_messages == [homework_module.parse_status(valid)], (
+            'Убедитесь, что статусы корректных домашних работ отправляются, '
+            'даже если в ответе есть некорректные.'
+        )
+        assert homework_module.sent_statuses == {1: 'approved'}, (
+            'Убедитесь, что отправленный статус запоминается.'
+        )
+
+    def test_send_statuses_keeps_partial_progress(
+            self, monkeypatch, homework_module
+    ):
+        sent_messages = []
+        results = iter((True, False, True))
+
+        def mock_send_message(bot, message=''):
+            sent_messages.append(message)
+            return next(results)
+
+        monkeypatch.setattr(homework_module, 'send_message', mock_send_message)
+        monkeypatch.setattr(homework_module, 'sent_statuses', {})
+        homeworks = [
+            {'id': i, 'homework_name': f'hw{i}' + 'x' * 3000,
+             'status': 'approved'}
+            for i in range(2)
+        ]
+        assert not homework_module.send_statuses(None, homeworks)
+        assert homework_module.send_statuses(None, homeworks)
+        assert sent_messages[1:] == [
+            homework_module.parse_status(homeworks[1])
+        ] * 2, (
+            'Убедитесь, что после сбоя отправки уже отправленные '
+            'сообщения не отправляются повторно.'
+        )
+
+    def test_select_unsent(self, monkeypatch, homework_module):
+        monkeypatch.setattr(
+            homework_module, 'sent_statuses', {1: 'approved', None: 'approved'}
+        )
+        homeworks = [
+            {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+            {'id': 1, 'homework_name': 'hw1', 'status': 'rejected'},
+            {'id': 2, 'homework_name': 'hw2', 'status': 'approved'},
+            {'homework_name': 'hw3', 'status': 'approved'},
+        ]
+        assert homework_module.select_unsent(homeworks) == homeworks[1:], (
+            'Убедитесь, что уже отправленный статус домашней работы '
+            'не отправляется в Telegram повторно.'
+        )
+
+    def test_format_error(self, homework_module):
+        assert homework_module.format_error(
+            KeyError('homeworks')
+        ).startswith('Ответ не содержит ключи'), (
+            'Убедитесь, что сообщение об ошибке выбирается по ее типу.'
+        )
+        assert homework_module.format_error(
+            json.JSONDecodeError('Expecting value', '', 0)
+        ).startswith('Ответ содержит неожиданные значения'), (
+            'Убедитесь, что для наследников зарегистрированных исключений '
+            'используется сообщение родительского класса.'
+        )
+        assert homework_module.format_error(
+            homework_module.EndpointRateLimited(30)
+        ).startswith('Превышен лимит запросов'), (
+            'Убедитесь, что для подкласса с собственным сообщением '
+            'не используется сообщение родительского класса.'
+        )
+
+    def test_handle_error_suppresses_recent_duplicates(
+            self, monkeypatch, homework_module
+    ):
+        sent_messages = []
+
+        def mock_send_message(bot, message=''):
+            sent_messages.append(message)
+
+        monkeypatch.setattr(homework_module, 'send_message', mock_send_message)
+        recent_errors = homework_module.deque(
+            maxlen=homework_module.ERROR_WINDOW_SIZE
+        )
+        for error_message in ('first', 'second', 'first', 'second'):
+            homework_module.handle_error(None, error_message, recent_errors)
+        assert sent_messages == ['first', 'second'], (
+            'Убедитесь, что недавно отправленные ошибки не отправляются '
+            'в Telegram повторно.'
+        )
+
+        sent_at, message_hash = recent_errors.popleft()
+        recent_errors.appendleft(
+            (sent_at - homework_module.ERROR_WINDOW - 1, message_hash)
+        )
+        homework_module.handle_error(None, 'first', recent_errors)
+        assert sent_messages[-1] == 'first', (
+            'Убедитесь, что ошибка снова отправляется в Telegram, когда '
+            'окно подавления повторов истекло.'
+        )
+
+    def test_handle_error_suppresses_repeated_connection_errors(
+            self, monkeypatch, current_timestamp, homework_module
+    ):
+        sent_messages = []
+
+        def mock_send_message(bot, message=''):
+            sent_messages.append(message)
+
+        attempts = []
+
+        def mock_request_get_refused(*args, **kwargs):
+            attempts.append(None)
+            raise requests.ConnectionError(
+                f'<HTTPSConnection object at 0x7f{len(attempts):08x}>: '
+                'Connection refused'
+            )
+
+        monkeypatch.setattr(homework_module, 'send_message', mock_send_message)
+        monkeypatch.setattr(
+            homework_module.SESSION, 'get', mock_request_get_refused
+        )
+        recent_errors = homework_module.deque(
+            maxlen=homework_module.ERROR_WINDOW_SIZE
+        )
+        for _ in range(2):
+            try:
+                homework_module.get_api_answer(current_timestamp)
+            except Exception as error:
+                homework_module.handle_error(
+                    None, homework_module.format_error(error), recent_errors
+                )
+        assert len(sent_messages) == 1, (
+            'Убедитесь, что повторяющийся сбой соединения с API домашки '
+            'отправляется в Telegram один раз.'
+        )
+
+    def test_webhook_sends_message(
+            self, webhook_server, homework_module, data_with_new_hw_status
+    ):
+        server, post_update = webhook_server
+        status = post_update({})
+        assert status == HTTPStatus.FORBIDDEN, (
+            'Убедитесь, что вебхук отклоняет запросы без секрета.'
+        )
+        status = post_update({homework_module.WEBHOOK_SECRET_HEADER: '\xe9'})
+        assert status == HTTPStatus.FORBIDDEN, (
+            'Убедитесь, что вебхук отклоняет секрет с не-ASCII символами.'
+        )
+        status = post_update(
+            {homework_module.WEBHOOK_SECRET_HEADER: WEBHOOK_SECRET}
+        )
+        assert status == HTTPStatus.OK, (
+            'Убедитесь, что вебхук принимает корректное обновление.'
+        )
+        hw_status = data_with_new_hw_status['homeworks'][0]['status']
+        assert self.HOMEWORK_VERDICTS[hw_status] in server.bot.text, (
+            'Убедитесь, что при получении обновления по вебхуку бот '
+            'отправляет в Telegram сообщение с вердиктом.'
+        )
+
+    def test_webhook_reports_failed_updates(
+            self, monkeypatch, webhook_server, homework_module
+    ):
+        monkeypatch.setattr(
+            homework_module, 'send_message', lambda bot, message: False
+        )
+        _, post_update = webhook_server
+        headers = {homework_module.WEBHOOK_SECRET_HEADER: WEBHOOK_SECRET}
+        for length in (
+                'abc', '-1', str(homework_module.WEBHOOK_MAX_BODY_SIZE + 1)
+        ):
+            status = post_update({**headers, 'Content-Length': length})
+            assert status == HTTPStatus.BAD_REQUEST, (
+                'Убедитесь, что вебхук отвечает 400 на некорректный '
+                f'заголовок `Content-Length`: {length}.'
+            )
+        monkeypatch.setattr(
+            homework_module.PracticumWebhookHandler, 'timeout', 0.1
+        )
+        status = post_update({**headers, 'Content-Length': '1000'})
+        assert status == HTTPStatus.REQUEST_TIMEOUT, (
+            'Убедитесь, что вебхук не ждет тело обновления бесконечно.'
+        )
+        failed_send_status = post_update(headers)
+        assert failed_send_status == HTTPStatus.BAD_GATEWAY, (
+            'Убедитесь, что вебхук отвечает ошибкой, если сообщение '
+            'не удалось отправить в Telegram.'
+        )
+
     def test_docstrings(self, homework_module):
         for func in self.HOMEWORK_FUNC_WITH_PARAMS_QTY:
             check_utils.check_docstring(homework_module, func)